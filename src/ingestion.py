@@ -11,95 +11,138 @@ python ingestion.py \
         --split-str "train"/"test"/"validate" 
 """
 
-import json 
-import logging 
-import argparse 
+import logging
+import argparse
 import fsspec
-import math 
+import msgspec
+import os
+import numpy as np
 
-from pathlib import Path 
-from typing import Dict, Any, Generator, Optional 
+from pathlib import Path
+from typing import Dict, Any, Generator, List, Optional
 
 logger = logging.getLogger(__name__)
 
-def load_json(path: Path) -> Any: 
-    try: 
-        with fsspec.open(path, "r", encoding="utf-8") as f: 
-            return json.load(f) 
-        
-    except Exception as e: 
+
+class Entry(msgspec.Struct):
+    """One data.json record; unknown fields are skipped during decode."""
+    id: int
+    caption: Optional[str] = None
+    image_path: Optional[str] = None
+
+
+def load_json(path: Path) -> Any:
+    try:
+        with fsspec.open(path, "rb") as f:
+            return msgspec.json.decode(f.read())
+
+    except Exception as e:
         logger.error(f"Failed to load JSON {path}: {e}")
-        raise 
-    
-    
-def load_json_as_dict(path: Path) -> Dict[str, Dict[str,str]]: 
-    try: 
-        with fsspec.open(path, "r", encoding="utf-8") as f: 
-            entries = json.load(f) 
-            
-            if isinstance(entries, dict): 
-                entries = [entries]
-                
-            return { 
-                    entry["id"]: {
-                        "caption": entry.get("caption"), 
-                        "image_path": entry.get("image_path")
-                    } 
-                    for entry in entries
-                }
-        
-    except Exception as e: 
+        raise
+
+
+def load_json_as_dict(path: Path) -> Dict[int, Entry]:
+    try:
+        with fsspec.open(path, "rb") as f:
+            data = f.read()
+
+        try:
+            # Schema-aware decode: no per-row dict allocation
+            entries = msgspec.json.decode(data, type=List[Entry])
+
+        except msgspec.ValidationError:
+            raw = msgspec.json.decode(data)
+
+            if isinstance(raw, dict):
+                raw = [raw]
+
+            entries = [
+                Entry(id=entry["id"], caption=entry.get("caption"),
+                      image_path=entry.get("image_path"))
+                for entry in raw
+            ]
+
+        return {entry.id: entry for entry in entries}
+
+    except Exception as e:
         logger.error(f"Failed to load JSON {path}: {e}")
-        raise 
-    
-    
-def normalize_entry(caption_id, image_id, root_dir: Path,  data_dict: Dict[str,Any], label: bool, split_str: str) -> Optional[Dict[str,Any]]: 
+        raise
+
+
+
+def _scan_image_files(root_dir: Path) -> Optional[set]:
+    if not root_dir.is_dir():
+        return None
+
+    known = set()
+
+    # followlinks keeps parity with Path.exists() when root_dir or a
+    # subdirectory is a symlink into a mounted dataset
+    for dirpath, _, filenames in os.walk(root_dir, followlinks=True):
+        rel = os.path.relpath(dirpath, root_dir)
+
+        for name in filenames:
+            known.add(name if rel == "." else os.path.join(rel, name))
+
+    return known
+
+
+def normalize_entry(caption_id, image_id, root_dir: Path,  data_dict: Dict[int, Entry], label: bool, split_str: str, known_files: Optional[set] = None) -> Optional[Dict[str,Any]]:
+    """
     """
-    """    
     caption_entry = data_dict.get(caption_id)
-    image_entry = data_dict.get(image_id) 
-    
-    if not caption_entry or not image_entry: 
+    image_entry = data_dict.get(image_id)
+
+    if not caption_entry or not image_entry or not image_entry.image_path:
         logger.warning(f"Missing entries for caption ID {caption_id}, image ID {image_id}")
-    
-    img_path = root_dir / image_entry["image_path"]
-    
-    if not img_path.exists(): 
+        return None
+
+    img_path = root_dir / image_entry.image_path
+
+    # Set lookup against the pre-scanned file list beats a stat syscall per row
+    if known_files is not None:
+        exists = os.path.normpath(image_entry.image_path) in known_files
+    else:
+        exists = img_path.exists()
+
+    if not exists:
         logger.warning(f"Missing image files for ID {image_id}, skipping...")
-        return None 
-    
-    return { 
-        "caption": caption_entry["caption"],
+        return None
+
+    return {
+        "caption": caption_entry.caption,
         "img_path": str(img_path), 
         "label": label, 
         "split": split_str,
     }
 
 
-def iter_entries(data_json: Path, root_dir: Path, split_json: Path, split_str: str) -> Generator[Dict[str,Any], None, None]: 
+def iter_entries(data_json: Path, root_dir: Path, split_json: Path, split_str: str) -> Generator[Dict[str,Any], None, None]:
     data_dict = load_json_as_dict(data_json)
-    
-    split_labels = load_json(split_json) 
+    known_files = _scan_image_files(root_dir)
+
+    split_labels = load_json(split_json)
     annotations = split_labels.get("annotations", [])
-    score_dist = {} #### 
-    
+
+    # One vectorized pass over the scores instead of a per-row dict update
+    scores = np.fromiter(
+        (entry.get("similarity_score", 0.0) or 0.0 for entry in annotations),
+        dtype=np.float64,
+        count=len(annotations),
+    )
+    score_dist = np.bincount(np.clip((scores * 10).astype(np.int64), 0, 10), minlength=11)
+    logger.info(f"similarity_score histogram (0.1 bins): {score_dist.tolist()}")
+
     for entry in annotations:
         caption_id = entry.get("id")
         image_id = entry.get("image_id")
         label = entry.get("falsified")
-        score = entry.get("similarity_score") #### 
-        
-   
-        score_dist[math.floor(score / .10)] = score_dist.get(math.floor(score / .10), 0) + 1 ###
-        
 
-        norm = normalize_entry(caption_id, image_id, root_dir, data_dict, label, split_str)
+        norm = normalize_entry(caption_id, image_id, root_dir, data_dict, label, split_str, known_files)
+
+        if norm:
 
-        if norm: 
-         
             yield norm
-            
-    print(score_dist)
 
 if __name__ == "__main__": 
     parser = argparse.ArgumentParser(description="VisualNews Data Ingestion")